@@ -1,174 +1,131 @@
+import matplotlib
+matplotlib.use('Agg')  # Charts are only ever written to files; skip GUI backend setup
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgb
 import numpy as np
 import re
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import mmap
 import os
+import zipfile
+
+# InfoSet line followed by its Strategy line, matched in a single pass
+# Format: InfoSet: P2:[P0:P][P1:P]75o Pot:1.4 Visits: 1885
+#         Strategy: 0.25 0.75
+# Groups: position index, hand (text after the last ']'), pot, visits, probabilities
+INFOSET_RE = re.compile(
+    rb'^[ \t]*InfoSet:\s+P(\d+):[^\n]*\]([^\s\]]+)[ \t]+Pot:([0-9.]+)[ \t]+Visits:[ \t]+(\d+)[ \t]*\r?\n'
+    rb'[ \t]*Strategy:[ \t]*([^\r\n]*)',
+    re.MULTILINE)
+
+# Number of seats in All-in or Fold (matches GameConfig::NUM_PLAYERS)
+NUM_POSITIONS = 4
+
+# Horizontal pixels per hand cell in the rendered strategy image
+CELL_RESOLUTION = 100
 
 def parse_infosets(file_path):
-    """Parse MCCFR strategy file and extract hand data"""
-    hand_data = {}
+    """Parse MCCFR strategy file into fold and all-in matrices of shape (NUM_POSITIONS, 13, 13)"""
+    fold = np.zeros((NUM_POSITIONS, 13, 13), dtype=np.float32)
+    all_in = np.zeros_like(fold)
     
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
+    with open(file_path, 'rb') as file:
+        # mmap cannot map an empty file
+        if os.fstat(file.fileno()).st_size == 0:
+            return fold, all_in
         
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Skip comments and empty lines
-        if line.startswith('#') or not line:
-            i += 1
-            continue
-            
-        # Parse InfoSet line
-        if line.startswith('InfoSet:'):
-            # Extract information from InfoSet line
-            # Format: InfoSet: P2:[P0:P][P1:P]75o Pot:1.4 Visits: 1885
-            info_match = re.match(r'InfoSet:\s+(.+)\s+Pot:([0-9.]+)\s+Visits:\s+(\d+)', line)
-            if info_match:
-                infoset_str = info_match.group(1)
-                pot_size = float(info_match.group(2))
-                visits = int(info_match.group(3))
+        # Scan the page cache directly instead of copying the file into memory
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            # Comment lines never start with 'InfoSet:', so the anchored pattern skips them
+            for match in INFOSET_RE.finditer(buf):
+                position_idx = int(match.group(1))
+                pos = hand_to_position(match.group(2).decode())
+                if position_idx >= NUM_POSITIONS or pos is None:
+                    continue
                 
-                # Parse position and hand from infoset string
-                # Format: P2:[P0:P][P1:P]75o or P2:[P0:P][P1:P]Q10o
-                position_match = re.match(r'P(\d+):', infoset_str)
-                # Extract hand from the end of the string after the last ']'
-                last_bracket = infoset_str.rfind(']')
-                if last_bracket != -1:
-                    hand = infoset_str[last_bracket + 1:].strip()
-                else:
-                    hand = None
+                # Only fold and all-in are used, so stop splitting after the first two tokens
+                strategy_str = match.group(5)
+                probabilities = strategy_str.split(None, 2)
                 
-                if position_match and hand:
-                    position = f"P{position_match.group(1)}"
-                    
-                    # Get strategy line
-                    if i + 1 < len(lines):
-                        strategy_line = lines[i + 1].strip()
-                        if strategy_line.startswith('Strategy:'):
-                            strategy_str = strategy_line.replace('Strategy:', '').strip()
-                            probabilities = [float(p) for p in strategy_str.split()]
-                            
-                            if len(probabilities) >= 2:
-                                fold_prob = probabilities[0]
-                                all_in_prob = probabilities[1]
-                                
-                                # Use position as the decision key
-                                hand_data[(position, hand)] = (fold_prob, all_in_prob)
-                                
-                            i += 2  # Skip strategy line
-                            continue
-                            
-        i += 1
-    
-    return hand_data
+                if len(probabilities) >= 2:
+                    row, col = pos
+                    fold[position_idx, row, col] = float(probabilities[0])
+                    all_in[position_idx, row, col] = float(probabilities[1])
+    
+    return fold, all_in
+
+def load_strategy(file_path):
+    """Load fold and all-in matrices, reusing the .npz cache beside the strategy file when it is up to date"""
+    cache_file = file_path + '.npz'
+    
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(file_path):
+        try:
+            with np.load(cache_file) as data:
+                fold, all_in = data['fold'], data['all_in']
+            print(f"Loaded cached matrices from {cache_file}")
+            return fold, all_in
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass  # Unreadable cache, parse the strategy file again
+    
+    print(f"Parsing strategy file: {file_path}")
+    fold, all_in = parse_infosets(file_path)
+    
+    try:
+        np.savez(cache_file, fold=fold, all_in=all_in)
+    except OSError:
+        pass  # Cache is an optimization; ignore read-only locations
+    
+    return fold, all_in
 
 # Function to map hands to matrix position
-def hand_to_position(hand):
-    """Convert hand string like 'AKo', 'AKs', 'AA', '1010', 'Q10o' to matrix position"""
+def _build_hand_positions():
+    """Precompute the matrix position of every hand spelling the strategy file can contain"""
     rank_map = {'2': 0, '3': 1, '4': 2, '5': 3, '6': 4, '7': 5, '8': 6, '9': 7, '10': 8, 'T': 8, 'J': 9, 'Q': 10, 'K': 11, 'A': 12}
     
-    try:
-        # Parse the hand string
-        if hand.endswith('o') or hand.endswith('s'):
-            # Suited or offsuit hand
-            suit_indicator = hand[-1]
-            hand_part = hand[:-1]
-            is_suited = suit_indicator.lower() == 's'
-        else:
-            # Pocket pair
-            hand_part = hand
-            is_suited = False
-        
-        # Extract ranks
-        if '10' in hand_part:
-            # Handle hands with 10
-            if hand_part.startswith('10'):
-                rank1 = '10'
-                rank2 = hand_part[2:]
-            elif hand_part.endswith('10'):
-                rank1 = hand_part[:-2]
-                rank2 = '10'
-            elif '10' in hand_part[1:]:
-                rank1 = hand_part[0]
-                rank2 = '10'
+    positions = {}
+    for rank1, rank1_value in rank_map.items():
+        for rank2, rank2_value in rank_map.items():
+            if rank1_value == rank2_value:
+                # Pocket pairs sit on the diagonal regardless of suit indicator
+                suited = offsuit = (rank1_value, rank2_value)
             else:
-                return None
-        else:
-            # Regular hands without 10
-            if len(hand_part) == 2:
-                rank1, rank2 = hand_part[0], hand_part[1]
-            else:
-                return None
-        
-        # Get rank indices
-        if rank1 not in rank_map or rank2 not in rank_map:
-            return None
-            
-        rank1_value = rank_map[rank1]
-        rank2_value = rank_map[rank2]
-        
-        # For pocket pairs, return diagonal position
-        if rank1_value == rank2_value:
-            return (rank1_value, rank2_value)
-        
-        # Return position for suited (above diagonal) or offsuit (below diagonal)
-        if is_suited:
-            return (min(rank1_value, rank2_value), max(rank1_value, rank2_value))
-        else:
-            return (max(rank1_value, rank2_value), min(rank1_value, rank2_value))
-    
-    except (ValueError, IndexError, KeyError):
-        # In case of invalid hands, return None
-        return None
-
-# Function to create the hand range plot
-def plot_hand_range(hand_data, position_filter=None, output_file=None):
-    """Create and save hand range plot"""
-    # Initialize a 13x13 matrix for the plot
-    fold_matrix = np.zeros((13, 13))
-    all_in_matrix = np.zeros((13, 13))
-    
-    # Populate the matrices with fold and all-in probabilities
-    for (position, hand), (fold_prob, all_in_prob) in hand_data.items():
-        # Filter by position if specified
-        if position_filter and position != position_filter:
-            continue
+                # Suited above the diagonal, offsuit below
+                suited = (min(rank1_value, rank2_value), max(rank1_value, rank2_value))
+                offsuit = (max(rank1_value, rank2_value), min(rank1_value, rank2_value))
             
-        pos = hand_to_position(hand)
-        
-        if pos:
-            row, col = pos
-            fold_matrix[row, col] = fold_prob
-            all_in_matrix[row, col] = all_in_prob
+            hand_part = rank1 + rank2
+            positions[hand_part + 's'] = suited
+            positions[hand_part + 'o'] = offsuit
+            # Hands without an indicator are treated as offsuit
+            positions[hand_part] = offsuit
     
-    # Create the plot
-    fig, ax = plt.subplots(figsize=(12, 10))
-    
-    # Card ranks for labels (reversed order from A to 2)
-    display_ranks = ['A', 'K', 'Q', 'J', '10', '9', '8', '7', '6', '5', '4', '3', '2']
+    return positions
+
+HAND_POSITIONS = _build_hand_positions()
+
+def hand_to_position(hand):
+    """Convert hand string like 'AKo', 'AKs', 'AA', '1010', 'Q10o' to matrix position"""
+    return HAND_POSITIONS.get(hand)
+
+# Card ranks for labels (reversed order from A to 2)
+DISPLAY_RANKS = ['A', 'K', 'Q', 'J', '10', '9', '8', '7', '6', '5', '4', '3', '2']
+
+def _build_hand_labels():
+    """Precompute (x, y, label) for the hand label in the upper left corner of every grid cell"""
     # Matrix indices for each rank
     rank_to_index = {'2': 0, '3': 1, '4': 2, '5': 3, '6': 4, '7': 5, '8': 6, '9': 7, '10': 8, 'J': 9, 'Q': 10, 'K': 11, 'A': 12}
     
-    # Define clearer blue and more reddish red
-    fold_color = '#0066CC'  # Clearer blue
-    all_in_color = '#FF3333'  # More reddish red
-    
-    # Create a grid for the rectangles
+    labels = []
     for i in range(13):
         for j in range(13):
             # Get the actual ranks based on the axis ordering
-            row_rank = display_ranks[12-i]  # Y-axis is 2 to A (top to bottom) - inverted
-            col_rank = display_ranks[j]     # X-axis is A to 2 (left to right)
+            row_rank = DISPLAY_RANKS[12-i]  # Y-axis is 2 to A (top to bottom) - inverted
+            col_rank = DISPLAY_RANKS[j]     # X-axis is A to 2 (left to right)
             
             # Get the matrix indices for these ranks
             row_idx = rank_to_index[row_rank]
             col_idx = rank_to_index[col_rank]
-                
-            # Get the fold and all-in probabilities
-            fold_width = fold_matrix[row_idx, col_idx]
-            all_in_width = all_in_matrix[row_idx, col_idx]
             
             # Determine if suited or offsuit based on position relative to diagonal
             if row_idx < col_idx:  # Above diagonal (suited)
@@ -178,27 +135,51 @@ def plot_hand_range(hand_data, position_filter=None, output_file=None):
             else:  # Diagonal (pairs)
                 hand_label = f"{col_rank}{row_rank}"
             
-            # Normalize if needed
-            total = fold_width + all_in_width
-            if total > 0:
-                fold_width = fold_width / total
-                all_in_width = all_in_width / total
-                
-                # Create rectangles for each probability
-                # Fold (blue) on the left side
-                rect_fold = plt.Rectangle((j, i), fold_width, 1, color=fold_color)
-                # All-in (red) on the right side
-                rect_all_in = plt.Rectangle((j + fold_width, i), all_in_width, 1, color=all_in_color)
-                
-                # Add rectangles to the plot
-                ax.add_patch(rect_fold)
-                ax.add_patch(rect_all_in)
-            
-            # Add hand label to the upper left corner of each square
-            ax.text(j + 0.05, i + 0.95, hand_label, 
-                    ha='left', va='top', 
-                    fontsize=8, color='white',
-                    fontweight='bold', fontfamily='serif')
+            labels.append((j + 0.05, i + 0.95, hand_label))
+    
+    return labels
+
+HAND_LABELS = _build_hand_labels()
+
+# Function to create the hand range plot
+def plot_hand_range(fold_matrix, all_in_matrix, position, output_file, dpi=300, compress_level=6):
+    """Create and save hand range plot from 13x13 fold and all-in matrices, returning the output path"""
+    # Create the plot
+    fig = plt.figure(figsize=(12, 10))
+    ax = fig.add_subplot()
+    
+    # Define clearer blue and more reddish red
+    fold_color = '#0066CC'  # Clearer blue
+    all_in_color = '#FF3333'  # More reddish red
+    
+    # Normalize each cell so fold + all-in fills its full width; empty cells stay blank
+    total = fold_matrix + all_in_matrix
+    filled = total > 0
+    fold_width = np.divide(fold_matrix, total, out=np.zeros_like(total), where=filled)
+    
+    # Flip both axes so image rows run A to 2 (top to bottom) and columns A to 2 (left to right)
+    fold_width = fold_width[::-1, ::-1]
+    filled = filled[::-1, ::-1]
+    
+    # Render every cell as one image row of CELL_RESOLUTION pixels by comparing each
+    # pixel offset against the cell's boundaries: fold (blue) pixels left of the fold
+    # boundary, all-in (red) pixels up to the cell edge, white where the cell is empty
+    offsets = np.arange(CELL_RESOLUTION)
+    fold_pixels = np.rint(fold_width * CELL_RESOLUTION)[..., None]
+    filled_pixels = np.where(filled, CELL_RESOLUTION, 0)[..., None]
+    fold_rgb, all_in_rgb = (np.rint(np.array([to_rgb(fold_color), to_rgb(all_in_color)]) * 255)
+                            .astype(np.uint8))
+    image = np.where((offsets < fold_pixels)[..., None], fold_rgb,
+                     np.where((offsets < filled_pixels)[..., None], all_in_rgb, np.uint8(255)))
+    ax.imshow(image.reshape(13, 13 * CELL_RESOLUTION, 3), extent=[0, 13, 0, 13], origin='upper',
+              aspect='auto', interpolation='nearest')
+    
+    # Add hand labels on top of the image
+    for x, y, hand_label in HAND_LABELS:
+        ax.text(x, y, hand_label, 
+                ha='left', va='top', 
+                fontsize=8, color='white',
+                fontweight='bold', fontfamily='serif')
     
     # Set axis limits
     ax.set_xlim(0, 13)
@@ -207,8 +188,8 @@ def plot_hand_range(hand_data, position_filter=None, output_file=None):
     # Set axis labels
     ax.set_xticks(np.arange(13) + 0.5)
     ax.set_yticks(np.arange(13) + 0.5)
-    ax.set_xticklabels(display_ranks)  # X-axis: A to 2 (left to right)
-    ax.set_yticklabels(list(reversed(display_ranks)))  # Y-axis: 2 to A (top to bottom)
+    ax.set_xticklabels(DISPLAY_RANKS)  # X-axis: A to 2 (left to right)
+    ax.set_yticklabels(list(reversed(DISPLAY_RANKS)))  # Y-axis: 2 to A (top to bottom)
     
     # Move x-axis labels to the top
     ax.xaxis.tick_top()
@@ -229,19 +210,20 @@ def plot_hand_range(hand_data, position_filter=None, output_file=None):
     
     # Add title with a nicer font
     title = f'Poker Hand Strategy Visualization'
-    if position_filter:
-        title += f' - {position_filter}'
+    if position:
+        title += f' - {position}'
     ax.set_title(title, fontfamily='serif', fontsize=14, pad=20)
     
-    # Save or display the plot
-    plt.tight_layout()
+    # Save the plot
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi, bbox_inches='tight',
+                pil_kwargs={'compress_level': compress_level, 'optimize': False})
     
-    if output_file:
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
-        print(f"Chart saved to {output_file}")
-        plt.close()  # Close the figure to free memory
-    else:
-        plt.show()
+    # Release the figure so batch runs do not accumulate figures
+    fig.clear()
+    plt.close(fig)
+    
+    return output_file
 
 def main():
     parser = argparse.ArgumentParser(description='Visualize MCCFR Strategy as GTO Wizard-style charts')
@@ -251,6 +233,8 @@ def main():
     parser.add_argument('--output-dir', '-d', help='Output directory for multiple charts')
     parser.add_argument('--all-positions', '-a', action='store_true', 
                        help='Generate charts for all positions')
+    parser.add_argument('--fast', '-f', action='store_true',
+                       help='Save charts at 150 dpi with light PNG compression for quicker iteration')
     
     args = parser.parse_args()
     
@@ -258,47 +242,63 @@ def main():
         print(f"Error: Strategy file '{args.strategy_file}' not found")
         return
     
-    # Parse the strategy file
-    print(f"Parsing strategy file: {args.strategy_file}")
-    hand_data = parse_infosets(args.strategy_file)
+    # Parse the strategy file (or load its cached matrices)
+    fold, all_in = load_strategy(args.strategy_file)
     
-    if not hand_data:
+    # Get available positions
+    positions = [f"P{i}" for i in range(NUM_POSITIONS) if (fold[i] + all_in[i]).any()]
+    
+    if not positions:
         print("No data found in the strategy file")
         return
     
-    # Get available positions
-    positions = set(position for position, hand in hand_data.keys())
-    print(f"Available positions: {sorted(positions)}")
+    print(f"Available positions: {positions}")
+    
+    # --fast trades resolution and file size for quicker PNG encoding
+    compress_level = 1 if args.fast else 6
     
     if args.all_positions:
         # Generate charts for all positions
         if args.output_dir:
             os.makedirs(args.output_dir, exist_ok=True)
             
-        for position in sorted(positions):
-            output_file = None
-            if args.output_dir:
-                output_file = os.path.join(args.output_dir, f'strategy_{position}.png')
-            elif args.output:
-                base, ext = os.path.splitext(args.output)
-                output_file = f"{base}_{position}{ext}"
-                
-            plot_hand_range(hand_data, position, output_file)
+        # Charts are independent, so render each position in its own worker process
+        with ProcessPoolExecutor(max_workers=len(positions)) as executor:
+            futures = []
+            for position in positions:
+                output_file = f'strategy_{position}.png'
+                if args.output_dir:
+                    output_file = os.path.join(args.output_dir, output_file)
+                elif args.output:
+                    base, ext = os.path.splitext(args.output)
+                    output_file = f"{base}_{position}{ext}"
+                    
+                # Batch charts are rendered at a lower resolution
+                i = int(position[1:])
+                futures.append(executor.submit(plot_hand_range, fold[i], all_in[i], position, output_file,
+                                               dpi=150, compress_level=compress_level))
+            
+            # Report from the parent in position order; result() also surfaces worker errors
+            for future in futures:
+                print(f"Chart saved to {future.result()}")
     else:
         # Generate chart for specific position or first available
         position = args.position
         if not position:
-            position = sorted(positions)[0]
+            position = positions[0]
             print(f"No position specified, using: {position}")
         elif position not in positions:
-            print(f"Position {position} not found. Available: {sorted(positions)}")
+            print(f"Position {position} not found. Available: {positions}")
             return
             
         output_file = args.output
         if not output_file:
             output_file = f'strategy_{position}.png'
             
-        plot_hand_range(hand_data, position, output_file)
+        i = int(position[1:])
+        plot_hand_range(fold[i], all_in[i], position, output_file,
+                        dpi=150 if args.fast else 300, compress_level=compress_level)
+        print(f"Chart saved to {output_file}")
 
 if __name__ == '__main__':
     main()